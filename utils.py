@@ -6,7 +6,12 @@
 # Utilities for knokbak/cyber-tools
 # OK - 27 Sep 2023
 
+import collections
 import random
+import socket
+import sys
+import threading
+from functools import lru_cache
 from typing import Any, Callable
 import zlib
 
@@ -125,20 +130,28 @@ def prompt_menu_selectable(menu_title: str, items: list[str], default: list[int]
 
 
 # Coverts a MAC address from bytes to a string
+@lru_cache(maxsize=4096)
 def mac_bytes_to_str(mac: bytes) -> str:
     return ':'.join(f'{b:02x}' for b in mac)
 
 
 # Converts an IPv4 address from bytes to a string
+@lru_cache(maxsize=4096)
 def ipv4_bytes_to_str(ipv4: bytes) -> str:
-    return '.'.join(str(b) for b in ipv4)
+    return socket.inet_ntop(socket.AF_INET, ipv4)
 
 
 # Converts an IPv6 address from bytes to a string
+@lru_cache(maxsize=4096)
 def ipv6_bytes_to_str(ipv6: bytes) -> str:
-    addr = ':'.join(f'{b:02x}' for b in ipv6)
-    addr = addr.replace(':0000:', '::').replace(':000:', '::').replace(':00:', '::')
-    return addr
+    return socket.inet_ntop(socket.AF_INET6, ipv6)
+
+
+# Converts an IPv4 or IPv6 address from bytes to a string, based on its length
+def ip_bytes_to_str(ip: bytes) -> str:
+    if len(ip) == 4:
+        return ipv4_bytes_to_str(ip)
+    return ipv6_bytes_to_str(ip)
 
 
 # Builds and prints a table from a list of rows to the console
@@ -167,6 +180,46 @@ def print_table(rows: list[list[str]]):
         print(text)
 
 
+# Collects lines and writes them to the console in chunks from a background thread, every interval seconds or once max_lines are waiting
+# Returns a function to queue a line, and a function which writes any remaining lines and stops the thread
+def start_buffered_printer(interval: float = 0.1, max_lines: int = 256) -> tuple[Callable[[str], None], Callable[[], None]]:
+    lines: collections.deque[str] = collections.deque()
+    lock = threading.Lock()
+    wake = threading.Event()
+    should_stop = threading.Event()
+
+    def flush():
+        with lock:
+            chunk = []
+            while lines:
+                chunk.append(lines.popleft())
+            if chunk:
+                sys.stdout.write('\n'.join(chunk) + '\n')
+                sys.stdout.flush()
+
+    def thread():
+        while not should_stop.is_set():
+            wake.wait(interval)
+            wake.clear()
+            flush()
+
+    thr = threading.Thread(target=thread, daemon=True)
+    thr.start()
+
+    def write(line: str):
+        lines.append(line)
+        if len(lines) >= max_lines:
+            wake.set()
+
+    def stop():
+        should_stop.set()
+        wake.set()
+        thr.join()
+        flush()
+
+    return write, stop
+
+
 # Request confirmation from the user before transmitting traffic over the network
 def confirm_network_transmit() -> bool:
     continuing = (input('\n\033[93m\033[1mI am about to send traffic over the network.\033[0m Continue? [Y/n]: ').lower() or 'y') == 'y'